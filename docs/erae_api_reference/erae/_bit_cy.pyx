@@ -0,0 +1,74 @@
+# cython: language_level=3
+# Cython build of the bit kernels (see _bit_kernels.py), used when Numba is
+# not installed. Same calling convention: (src, dst) -> checksum
+cimport cython
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def bitize7(const unsigned char[::1] src, unsigned char[::1] dst):
+    cdef Py_ssize_t i, j, k, o = 0, n = src.shape[0]
+    cdef unsigned char hdr, b, chksum = 0
+    with nogil:
+        for i in range(0, n, 7):
+            k = min(7, n - i)
+            hdr = 0
+            for j in range(k):
+                hdr |= (src[i + j] & 0x80) >> (j + 1)
+            dst[o] = hdr
+            chksum ^= hdr
+            for j in range(k):
+                b = src[i + j] & 0x7F
+                dst[o + 1 + j] = b
+                chksum ^= b
+            o += k + 1
+    return chksum
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def unbitize7(const unsigned char[::1] src, unsigned char[::1] dst):
+    cdef Py_ssize_t i = 0, j, o = 0, n = src.shape[0]
+    cdef unsigned char hdr, b, chksum = 0
+    with nogil:
+        while i < n:
+            hdr = src[i]
+            chksum ^= hdr
+            for j in range(1, min(8, n - i)):
+                b = src[i + j]
+                chksum ^= b
+                dst[o + j - 1] = ((hdr << j) & 0x80) | b
+            o += 7
+            i += 8
+    return chksum
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def bgr_to_bitized7(const unsigned char[:, :, :] bgr, unsigned char[::1] dst):
+    cdef Py_ssize_t y, x, c, o = 0, h = 0, j = 7
+    cdef Py_ssize_t height = bgr.shape[0], width = bgr.shape[1]
+    cdef unsigned char v, b, hdr = 0, chksum = 0
+    with nogil:
+        for y in range(height - 1, -1, -1):
+            for x in range(width):
+                for c in range(2, -1, -1):
+                    if j == 7:
+                        if o > 0:
+                            dst[h] = hdr
+                            chksum ^= hdr
+                        h = o
+                        o += 1
+                        j = 0
+                        hdr = 0
+                    v = bgr[y, x, c]
+                    hdr |= (v & 0x80) >> (j + 1)
+                    b = v & 0x7F
+                    dst[o] = b
+                    chksum ^= b
+                    o += 1
+                    j += 1
+        if o > 0:
+            dst[h] = hdr
+            chksum ^= hdr
+    return chksum
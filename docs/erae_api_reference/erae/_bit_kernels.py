@@ -0,0 +1,96 @@
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True, nogil=True, boundscheck=False)
+def bitize7_nb(src, dst):
+    # 7-bitize src (uint8) into dst (uint8, at least bitized7size(len(src)) long)
+    # and return the XOR checksum of the written bytes
+    n = src.shape[0]
+    o = 0
+    chksum = 0
+    for i in range(0, n, 7):
+        k = min(7, n - i)
+        hdr = 0
+        for j in range(k):
+            hdr |= (src[i + j] & 0x80) >> (j + 1)
+        dst[o] = hdr
+        chksum ^= hdr
+        for j in range(k):
+            b = src[i + j] & 0x7F
+            dst[o + 1 + j] = b
+            chksum ^= b
+        o += k + 1
+    return chksum
+
+
+@njit(cache=True, nogil=True, boundscheck=False)
+def unbitize7_nb(src, dst):
+    # Rebuild the 8-bit data of src (uint8) into dst (uint8, at least
+    # unbitized7size(len(src)) long) and return the XOR checksum of src
+    n = src.shape[0]
+    i = 0
+    o = 0
+    chksum = 0
+    while i < n:
+        hdr = src[i]
+        chksum ^= hdr
+        for j in range(1, min(8, n - i)):
+            b = src[i + j]
+            chksum ^= b
+            dst[o + j - 1] = ((hdr << j) & 0x80) | b
+        o += 7
+        i += 8
+    return chksum
+
+
+@njit(cache=True, nogil=True, boundscheck=False)
+def bgr_to_bitized7_nb(bgr, dst):
+    # 7-bitize the pixels of a BGR image (height, width, 3) as bottom-up rows of
+    # RGB bytes (Erae origin is bottom left) into dst (uint8, at least
+    # bitized7size(bgr.size) long) and return the XOR checksum of the written bytes
+    height, width, _ = bgr.shape
+    o = 0       # next byte to write
+    h = 0       # index of the current group header
+    j = 7       # position in the current group
+    hdr = 0
+    chksum = 0
+    for y in range(height - 1, -1, -1):
+        for x in range(width):
+            for c in range(2, -1, -1):
+                if j == 7:
+                    if o > 0:
+                        dst[h] = hdr
+                        chksum ^= hdr
+                    h = o
+                    o += 1
+                    j = 0
+                    hdr = 0
+                v = bgr[y, x, c]
+                hdr |= (v & 0x80) >> (j + 1)
+                b = v & 0x7F
+                dst[o] = b
+                chksum ^= b
+                o += 1
+                j += 1
+    if o > 0:
+        dst[h] = hdr
+        chksum ^= hdr
+    return chksum
+
+
+def _warmup():
+    # Compile (or load from cache) the kernels at import so that the first
+    # call does not stall the MIDI thread
+    src = np.zeros(8, dtype=np.uint8)
+    dst = np.zeros(10, dtype=np.uint8)
+    bitize7_nb(src, dst)
+    unbitize7_nb(dst, src)
+    bgr = np.zeros((2, 4, 3), dtype=np.uint8)
+    bgr_dst = np.zeros(28, dtype=np.uint8)  # bitized7size(bgr.size)
+    bgr_to_bitized7_nb(bgr, bgr_dst)
+    # Strided views (e.g. a crop of a bigger image) use another specialization
+    bgr_to_bitized7_nb(bgr[:, ::2], bgr_dst)
+
+
+_warmup()
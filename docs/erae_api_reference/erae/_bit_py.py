@@ -0,0 +1,45 @@
+# Pure Python version of the bit kernels (see _bit_kernels.py), last fallback
+# when neither Numba nor the Cython extension is available. Same calling
+# convention: (src, dst) -> checksum
+from functools import reduce
+from operator import xor
+
+import numpy as np
+
+_LOW7 = bytes(el & 0x7F for el in range(256))
+
+
+def bitize7(src, dst):
+    data = bytes(src)
+    bitized7Arr = bytearray()
+    for i in range(0, len(data), 7):
+        chunk = data[i:i + 7]
+        bitized7Arr.append(sum((el & 0x80) >> (j + 1)
+                           for j, el in enumerate(chunk)))
+        bitized7Arr += chunk.translate(_LOW7)
+    dst[:len(bitized7Arr)] = np.frombuffer(bitized7Arr, dtype=np.uint8)
+    return reduce(xor, bitized7Arr, 0)
+
+
+def unbitize7(src, dst):
+    bitized_data = bytes(src)
+    inlen = len(bitized_data)
+    original_data = bytearray(len(dst))
+
+    i = 0
+    outsize = 0
+    while i < inlen:
+        for j in range(7):
+            if (j + 1 + i < inlen):
+                original_data[outsize + j] = ((bitized_data[i]
+                                               << (j + 1)) & 0x80) | bitized_data[i + j + 1]
+        outsize = outsize + 7
+        i = i + 8
+
+    dst[:] = np.frombuffer(original_data, dtype=np.uint8)
+    return reduce(xor, bitized_data, 0)
+
+
+def bgr_to_bitized7(bgr, dst):
+    # Erae order: RGB, bottom row first
+    return bitize7(np.ascontiguousarray(bgr[::-1, :, ::-1]).ravel(), dst)
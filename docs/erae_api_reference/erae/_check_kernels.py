@@ -0,0 +1,81 @@
+"""Check that every available bit kernel backend matches the pure Python one.
+
+Run from this directory:
+
+    python -m erae._check_kernels
+
+Each backend that can be imported (AOT erae_kernels, Numba JIT, Cython) is
+compared against _bit_py on random data, output bytes and checksum included.
+"""
+import importlib
+import sys
+
+import numpy as np
+
+from . import _bit_py
+from .utils import bitized7size, unbitized7size
+
+# module name -> (bitize7, unbitize7, bgr_to_bitized7) attribute names
+_BACKENDS = {
+    'erae_kernels': ('bitize7', 'unbitize7', 'bgr_to_bitized7'),
+    '_bit_kernels': ('bitize7_nb', 'unbitize7_nb', 'bgr_to_bitized7_nb'),
+    '_bit_cy': ('bitize7', 'unbitize7', 'bgr_to_bitized7'),
+}
+
+
+def _run(func, src, size):
+    dst = np.zeros(size, dtype=np.uint8)
+    chksum = func(src, dst)
+    return dst.tobytes(), int(chksum)
+
+
+def check_backend(kernels, rng) -> list[str]:
+    bitize7, unbitize7, bgr_to_bitized7 = kernels
+    errors = []
+
+    for n in list(range(0, 64)) + [1728, 4000]:
+        data = rng.integers(0, 256, n, dtype=np.uint8)
+        size = bitized7size(n)
+        expected = _run(_bit_py.bitize7, data, size)
+        if _run(bitize7, data, size) != expected:
+            errors.append(f"bitize7 mismatch for {n} bytes")
+
+        # Round trip, and unbitize of arbitrary 7-bit data
+        bitized = np.frombuffer(bytearray(expected[0]), dtype=np.uint8)
+        if _run(unbitize7, bitized, n)[0] != data.tobytes():
+            errors.append(f"unbitize7 round trip mismatch for {n} bytes")
+        raw = rng.integers(0, 128, n, dtype=np.uint8)
+        if _run(unbitize7, raw, unbitized7size(n)) != _run(_bit_py.unbitize7, raw, unbitized7size(n)):
+            errors.append(f"unbitize7 mismatch for {n} bytes")
+
+    for height, width in [(1, 1), (3, 5), (7, 9), (24, 24)]:
+        image = rng.integers(0, 256, (2 * height, 2 * width, 3), dtype=np.uint8)
+        for bgr in (np.ascontiguousarray(image[:height, :width]), image[::2, ::2]):
+            size = bitized7size(bgr.size)
+            if _run(bgr_to_bitized7, bgr, size) != _run(_bit_py.bgr_to_bitized7, bgr, size):
+                errors.append(
+                    f"bgr_to_bitized7 mismatch for {height}x{width} "
+                    f"({'contiguous' if bgr.flags.c_contiguous else 'strided'})")
+
+    return errors
+
+
+def main() -> int:
+    rng = np.random.default_rng(0)
+    failed = False
+    for module_name, names in _BACKENDS.items():
+        try:
+            module = importlib.import_module('.' + module_name, __package__)
+        except ImportError:
+            print(f"{module_name}: not available")
+            continue
+        errors = check_backend([getattr(module, name) for name in names], rng)
+        print(f"{module_name}: {'OK' if not errors else 'FAILED'}")
+        for error in errors:
+            print(f"  {error}")
+        failed = failed or bool(errors)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
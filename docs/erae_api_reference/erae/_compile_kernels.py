@@ -0,0 +1,26 @@
+"""Ahead-of-time compilation of the bit kernels.
+
+Run once at build/install time from this directory:
+
+    python -m erae._compile_kernels
+
+This writes the erae_kernels extension next to this file; utils then uses it
+instead of the JIT kernels, so no LLVM compilation happens at runtime.
+"""
+import os
+
+from numba.pycc import CC
+
+from ._bit_kernels import bgr_to_bitized7_nb, bitize7_nb, unbitize7_nb
+
+cc = CC('erae_kernels')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Same calling convention as the JIT kernels: (src, dst) -> checksum
+cc.export('bitize7', 'i8(u1[::1], u1[::1])')(bitize7_nb.py_func)
+cc.export('unbitize7', 'i8(u1[::1], u1[::1])')(unbitize7_nb.py_func)
+cc.export('bgr_to_bitized7', 'i8(u1[:, :, :], u1[::1])')(
+    bgr_to_bitized7_nb.py_func)
+
+if __name__ == '__main__':
+    cc.compile()
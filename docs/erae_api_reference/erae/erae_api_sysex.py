@@ -1,7 +1,10 @@
 from enum import Enum
+import numpy as np
 import rtmidi
 import struct
+import threading
 import time
+import traceback
 
 from . import utils
 from abc import ABC, abstractmethod
@@ -40,6 +43,46 @@ NON_FINGER = 0x7F
 ZONE_BOUNDARY_REPLY = 0x01
 API_VERSION_REPLY = 0x02
 
+# Draw Image header: command, zone id, x, y, width, height
+_DRAW_IMAGE_HEADER_ST = struct.Struct('BBBBBB')
+
+# Reply layouts
+_ZONE_BOUNDARY_ST = struct.Struct('BBBB')  # reply id, zone id, width, height
+_FINGER_HEADER_ST = struct.Struct('BB')    # action/finger byte, zone id
+
+# Finger stream payload layouts (little endian)
+_FID_ST = struct.Struct('<Q')     # finger id
+_XYZ_ST = struct.Struct('<fff')   # x, y, z
+_FID_BITSIZE = utils.bitized7size(_FID_ST.size)
+_XYZ_BITSIZE = utils.bitized7size(_XYZ_ST.size)
+# action/finger byte, zone id, bitized finger id and x/y/z, checksum
+_FINGER_FRAME_SIZE = _FINGER_HEADER_ST.size + _FID_BITSIZE + _XYZ_BITSIZE + 1
+
+
+def _check_7bit(message_bytes) -> None:
+    # Raise exception so we can trace the erroneous message
+    for msg in message_bytes:
+        if msg < 0 or msg > 127:
+            raise Exception(
+                "Sysex msg contains values outside [0x00; 0x7F]: {}".format(
+                    ', '.join(hex(x) for x in message_bytes)))
+
+
+def _check_bgr(bgr: np.ndarray, width: int, height: int) -> None:
+    # The image must match the announced size, and be uint8 for the kernels
+    if bgr.shape != (height, width, 3):
+        raise Exception("BGR image shape {} does not match (height={}, width={}, 3)".format(
+            bgr.shape, height, width))
+    if bgr.dtype != np.uint8:
+        raise Exception(
+            "BGR image dtype must be uint8, got {}".format(bgr.dtype))
+
+
+def _wrap_sysex(payload: bytes) -> bytes:
+    # Wrap bytes with SysEx start(F0) and end(F7) without validation: only for
+    # payloads that are 7-bit by construction, see create_sysex_message otherwise
+    return bytes((SYSEX_START,)) + payload + bytes((SYSEX_END,))
+
 
 class EraeReplyHandler(ABC):
     """Abstract class to have custom hanlder of the API reply"""
@@ -119,203 +162,255 @@ class EraeAPISysex:
             print("Erae Product undedefined")
             exit()
 
-        # Set the callback to process received messages
+        # Common prefix of every API message sent to this device
+        self._prefix = bytes(EMBODME_MANFACTURER_ID + ERAE_HARDWARE_FAMILY_CODE + self.family_member_code +
+                             ERAE_MIDI_NETWORK_ID + ERAE_SERVICE + ERAE_API)
+
+        # Scratch buffer reused by unbitize7chksum to avoid allocating on
+        # every received message (images are bitized straight into the
+        # outgoing message, see _draw_image_message)
+        self._unbit_scratch = bytearray(4096)
+
+        # Received messages are polled and parsed by a dedicated thread,
+        # started with the API mode (see _pump)
         self.midi_in.ignore_types(sysex=False)
+        self._callback_data = None
+        self._running = False
+        self._pump_thread = None
+
+        # Bound once, used by every sender
+        self._send = self.midi_out.send_message
 
     class CallbackDataMidi(object):
-        def __init__(self, receiver_prefix: list[int], erae_reply_handler: EraeReplyHandler) -> None:
-            self.receiver_prefix = receiver_prefix
+        def __init__(self, receiver_prefix: list[int], erae_reply_handler: EraeReplyHandler, unbit_scratch: bytearray = None) -> None:
+            self.receiver_prefix = bytes(receiver_prefix)
             self.erae_reply_handler = erae_reply_handler
+            self.unbit_scratch = unbit_scratch
 
     @classmethod
-    def create_sysex_message(cls, message_bytes: list[int]):
-        """Helper function to wrap bytes with SysEx start(F0) and end(F7)."""
+    def create_sysex_message(cls, message_bytes: list[int]) -> bytes:
+        """Helper function to wrap bytes with SysEx start(F0) and end(F7), checking they are 7-bit."""
 
-        # Raise exception so we can trace the erroneous message
-        for msg in message_bytes:
-            if msg < 0 or msg > 127:
-                raise Exception(
-                    "Sysex msg contains values outside [0x00; 0x7F]: {}".format(
-                        ', '.join(hex(x) for x in message_bytes)))
-
-        return [SYSEX_START] + message_bytes + [SYSEX_END]
+        _check_7bit(message_bytes)
+        return _wrap_sysex(bytes(message_bytes))
 
     @classmethod
     def receive_midi_message(cls, message, callback_data: CallbackDataMidi):
-        """Callback function to handle incoming MIDI messages."""
+        """Handle one incoming MIDI message (as returned by MidiIn.get_message)."""
         receiver_prefix = callback_data.receiver_prefix
         erae_handler = callback_data.erae_reply_handler
+        scratch = callback_data.unbit_scratch
 
         msg, timestamp = message
 
         # print("Received SysEx message: {}".format(
         #     ', '.join(hex(x) for x in msg)))
 
-        # Check if the message is a SysEx message
-        if msg[0] == SYSEX_START and msg[-1] == SYSEX_END:
-            # Extract the SysEx message (excluding F0 and F7)
-            sysex_message = msg[1:-1]
+        buf = bytearray(msg)
+
+        # Check if the message is a SysEx message addressed to this receiver
+        # (offsets below are relative to the full message, F0 included)
+        if buf[0] == SYSEX_START and buf[-1] == SYSEX_END and \
+                len(buf) - 2 > len(receiver_prefix) and buf.startswith(receiver_prefix, 1):
+            offset = 1 + len(receiver_prefix)
 
-            if len(sysex_message) > len(receiver_prefix) and sysex_message[0: len(receiver_prefix)] == receiver_prefix:
-                offset = len(receiver_prefix)
+            # Frames too short for their type are ignored
+            end = len(buf) - 1  # index of F7
 
-                # Non Finger Stream
-                if sysex_message[offset] == NON_FINGER:
-                    offset += 1
+            # Non Finger Stream
+            if buf[offset] == NON_FINGER:
+                offset += 1
 
-                    if sysex_message[offset] == ZONE_BOUNDARY_REPLY:
-                        offset += 1
+                if offset >= end:
+                    return
 
-                        zone_id = sysex_message[offset]
-                        offset += 1
+                if buf[offset] == ZONE_BOUNDARY_REPLY:
+                    if end < offset + _ZONE_BOUNDARY_ST.size:
+                        return
 
-                        width = sysex_message[offset]
-                        offset += 1
+                    _, zone_id, width, height = _ZONE_BOUNDARY_ST.unpack_from(
+                        buf, offset)
 
-                        height = sysex_message[offset]
+                    erae_handler.zone_boundary_reply(zone_id, width, height)
 
-                        erae_handler.zone_boundary_reply(
-                            zone_id, width, height)
+                elif buf[offset] == API_VERSION_REPLY:
+                    if end < offset + 2:
+                        return
 
-                    if sysex_message[offset] == API_VERSION_REPLY:
-                        offset += 1
+                    api_version = buf[offset + 1]
 
-                        api_version = sysex_message[offset]
-                        offset += 1
+                    erae_handler.api_version(api_version)
 
-                        erae_handler.api_version(api_version)
+            # Finger Stream
+            else:
+                if end < offset + _FINGER_FRAME_SIZE:
+                    return
 
-                # Finger Stream
-                else:
-                    action_finger_byte = sysex_message[offset]
-                    offset += 1
+                action_finger_byte, zone_id = _FINGER_HEADER_ST.unpack_from(
+                    buf, offset)
+                offset += _FINGER_HEADER_ST.size
 
-                    zone_id = sysex_message[offset]
-                    offset += 1
+                # Views on the message, no copy
+                finger_id_data = np.frombuffer(
+                    buf, dtype=np.uint8, count=_FID_BITSIZE, offset=offset)
+                offset += _FID_BITSIZE
 
-                    finger_id_data_length = utils.bitized7size(8)
-                    finger_id_data = sysex_message[offset:offset +
-                                                   finger_id_data_length]
-                    offset += finger_id_data_length
+                xyz_data = np.frombuffer(
+                    buf, dtype=np.uint8, count=_XYZ_BITSIZE, offset=offset)
+                offset += _XYZ_BITSIZE
 
-                    xyz_data_length = utils.bitized7size(3*4)
-                    xyz_data = sysex_message[offset:offset+xyz_data_length]
-                    offset += xyz_data_length
+                xyz_data_checksum = buf[offset]
 
-                    xyz_data_checksum = sysex_message[offset]
+                # Unibit (both share the scratch buffer: finger_id is unpacked first)
+                finger_id_unbitized = utils.unbitize7chksum(
+                    finger_id_data, out=scratch)
+                finger_id = _FID_ST.unpack_from(finger_id_unbitized)[0]
 
-                    # Unibit
-                    finger_id_unbitized = utils.unbitize7chksum(
-                        finger_id_data)
-                    finger_id = struct.unpack(
-                        '<Q', bytearray(finger_id_unbitized))[0]
+                xyz_data_unbitized = utils.unbitize7chksum(
+                    xyz_data, xyz_data_checksum, out=scratch)
+                x, y, z = _XYZ_ST.unpack_from(xyz_data_unbitized)
 
-                    xyz_data_unbitized = utils.unbitize7chksum(
-                        xyz_data, xyz_data_checksum)
-                    x = struct.unpack('<f', bytearray(
-                        xyz_data_unbitized[0:4]))[0]
-                    y = struct.unpack('<f', bytearray(
-                        xyz_data_unbitized[4:8]))[0]
-                    z = struct.unpack('<f', bytearray(
-                        xyz_data_unbitized[8:12]))[0]
+                action = (action_finger_byte) & 0x07
 
-                    action = (action_finger_byte) & 0x07
+                erae_handler.finger_detection(
+                    finger_id, zone_id, action, x, y, z)
 
-                    erae_handler.finger_detection(
-                        finger_id, zone_id, action, x, y, z)
+    def _start_pump(self, callback_data: CallbackDataMidi) -> None:
+        """Route the received messages to callback_data, starting the poll thread if needed."""
+        self._callback_data = callback_data
+        if self._pump_thread is None:
+            self._running = True
+            self._pump_thread = threading.Thread(target=self._pump, daemon=True)
+            self._pump_thread.start()
+
+    def _pump(self) -> None:
+        """Poll the MIDI input and parse the received messages in batches."""
+        get_message = self.midi_in.get_message
+        while self._running:
+            message = get_message()
+            if message is None:
+                time.sleep(0.0005)
+                continue
+
+            # Parse everything already queued before sleeping again
+            callback_data = self._callback_data
+            while message is not None:
+                # A bad frame or a failing handler must not stop the input
+                try:
+                    EraeAPISysex.receive_midi_message(message, callback_data)
+                except Exception:
+                    traceback.print_exc()
+                message = get_message()
 
     def send_sysex_message(self, message_bytes: list[int], verbose: bool = False) -> None:
         """Send a SysEx message."""
         sysex_message = EraeAPISysex.create_sysex_message(message_bytes)
-        self.midi_out.send_message(sysex_message)
+        self._send(sysex_message)
         if verbose:
-            print("Sent SysEx message: {}".format(
-                ', '.join(hex(x) for x in sysex_message)))
+            print("Sent SysEx message: {}".format(sysex_message.hex(' ')))
+
+    def _api_message(self, command: int, fields=()) -> bytes:
+        # Complete SysEx message for an API command: the device prefix and the
+        # command are 7-bit constants, only the caller supplied fields are checked
+        _check_7bit(fields)
+        message = bytearray(self._prefix)
+        message.append(command)
+        message.extend(fields)
+        return _wrap_sysex(message)
 
     def enable_api_mode(self, receiver_prefix: list[int], erae_handler: EraeReplyHandler) -> None:
         """Enable API mode on the Erae device."""
-        message = EMBODME_MANFACTURER_ID + ERAE_HARDWARE_FAMILY_CODE + self.family_member_code + ERAE_MIDI_NETWORK_ID + ERAE_SERVICE + ERAE_API + [
-            API_MODE_ENABLE
-        ] + receiver_prefix
+        message = self._api_message(API_MODE_ENABLE, receiver_prefix)
 
-        self.midi_in.set_callback(
-            EraeAPISysex.receive_midi_message, EraeAPISysex.CallbackDataMidi(receiver_prefix, erae_handler))
+        self._start_pump(EraeAPISysex.CallbackDataMidi(
+            receiver_prefix, erae_handler, self._unbit_scratch))
 
-        self.send_sysex_message(message)
+        self._send(message)
 
     def disable_api_mode(self) -> None:
         """Disable API mode on the Erae device."""
-        message = EMBODME_MANFACTURER_ID + ERAE_HARDWARE_FAMILY_CODE + self.family_member_code + ERAE_MIDI_NETWORK_ID + ERAE_SERVICE + ERAE_API + [
-            API_MODE_DISABLE
-        ]
-        self.send_sysex_message(message)
+        self._send(self._api_message(API_MODE_DISABLE))
 
     def send_api_version_request(self, receiver_prefix: list[int], erae_handler: EraeReplyHandler) -> None:
         """Send a Zone Boundary Request message."""
-        message = EMBODME_MANFACTURER_ID + ERAE_HARDWARE_FAMILY_CODE + self.family_member_code + ERAE_MIDI_NETWORK_ID + ERAE_SERVICE + ERAE_API + [
-            API_VERSIONREQUEST_COMMAND
-        ] + receiver_prefix
+        message = self._api_message(
+            API_VERSIONREQUEST_COMMAND, receiver_prefix)
 
-        self.midi_in.set_callback(
-            EraeAPISysex.receive_midi_message, EraeAPISysex.CallbackDataMidi(receiver_prefix, erae_handler))
+        self._start_pump(EraeAPISysex.CallbackDataMidi(
+            receiver_prefix, erae_handler, self._unbit_scratch))
 
-        self.send_sysex_message(message)
+        self._send(message)
 
     def send_zone_boundary_request(self, zone_id: int) -> None:
         """Send a Zone Boundary Request message."""
-        message = EMBODME_MANFACTURER_ID + ERAE_HARDWARE_FAMILY_CODE + self.family_member_code + ERAE_MIDI_NETWORK_ID + ERAE_SERVICE + ERAE_API + [
-            ZONE_BOUNDARY_REQUEST_COMMAND
-        ]
-        message.append(zone_id)
-        self.send_sysex_message(message)
+        self._send(self._api_message(
+            ZONE_BOUNDARY_REQUEST_COMMAND, (zone_id,)))
+
+    def compile_clear_zone(self, zone_id: int) -> bytes:
+        """Build a complete Clear Zone Display SysEx message, ready to be sent as is."""
+        return self._api_message(CLEAR_ZONE_COMMAND, (zone_id,))
 
     def send_clear_zone_display(self, zone_id: int) -> None:
         """Send a Clear Zone Display message."""
-        message = EMBODME_MANFACTURER_ID + ERAE_HARDWARE_FAMILY_CODE + self.family_member_code + ERAE_MIDI_NETWORK_ID + ERAE_SERVICE + ERAE_API + [
-            CLEAR_ZONE_COMMAND
-        ]
-        message.append(zone_id)
-        self.send_sysex_message(message)
+        self._send(self.compile_clear_zone(zone_id))
 
     def send_draw_pixel(self, zone_id: int, xpos: int, ypos: int, red: int, green: int, blue: int) -> None:
         """Send a Draw Pixel message."""
-        message = EMBODME_MANFACTURER_ID + ERAE_HARDWARE_FAMILY_CODE + self.family_member_code + \
-            ERAE_MIDI_NETWORK_ID + ERAE_SERVICE + \
-            ERAE_API + [DRAW_PIXEL_COMMAND]
-        message.append(zone_id)
-        message.append(xpos)
-        message.append(ypos)
-        message.extend([red, green, blue])  # RGB values
-        self.send_sysex_message(message)
+        self._send(self._api_message(DRAW_PIXEL_COMMAND, (
+            zone_id, xpos, ypos, red, green, blue)))
 
     def send_draw_rectangle(self, zone_id: int, xpos: int, ypos: int, width: int, height: int, red: int, green: int, blue: int) -> None:
         """Send a Draw Rectangle message."""
-        message = EMBODME_MANFACTURER_ID + ERAE_HARDWARE_FAMILY_CODE + self.family_member_code + ERAE_MIDI_NETWORK_ID + ERAE_SERVICE + ERAE_API + [
-            DRAW_RECTANGLE_COMMAND
-        ]
-        message.append(zone_id)
-        message.append(xpos)
-        message.append(ypos)
-        message.append(width)
-        message.append(height)
-        message.extend([red, green, blue])  # RGB values
-        self.send_sysex_message(message)
-
-    def send_draw_image(self, zone_id: int, xpos: int, ypos: int, width: int, height: int, rgb_data: list[int]) -> None:
-        """Send a Draw Image message."""
-        message = EMBODME_MANFACTURER_ID + ERAE_HARDWARE_FAMILY_CODE + self.family_member_code + ERAE_MIDI_NETWORK_ID + ERAE_SERVICE + ERAE_API + [
-            DRAW_IMAGE_COMMAND
-        ]
-        message.append(zone_id)
-        message.append(xpos)
-        message.append(ypos)
-        message.append(width)
-        message.append(height)
-        data_bitized_checksum = utils.bitize7chksum(rgb_data)
-        message.extend(data_bitized_checksum)
-        self.send_sysex_message(message)
+        self._send(self._api_message(DRAW_RECTANGLE_COMMAND, (
+            zone_id, xpos, ypos, width, height, red, green, blue)))
+
+    def _draw_image_message(self, zone_id: int, xpos: int, ypos: int, width: int, height: int, bitize, data: np.ndarray) -> bytearray:
+        # The message is allocated at its final size and written once: header
+        # first, then bitize (utils.bitize7chksum[_bgr]) fills the payload and
+        # checksum in place. The payload is 7-bit by construction, so only the
+        # caller supplied header fields are checked
+        _check_7bit((zone_id, xpos, ypos, width, height))
+        header_end = 1 + len(self._prefix) + _DRAW_IMAGE_HEADER_ST.size
+        bit_size = utils.bitized7size(data.size) + 1  # + checksum
+        message = bytearray(header_end + bit_size + 1)
+        message[0] = SYSEX_START
+        message[1:1 + len(self._prefix)] = self._prefix
+        _DRAW_IMAGE_HEADER_ST.pack_into(message, 1 + len(self._prefix),
+                                        DRAW_IMAGE_COMMAND, zone_id, xpos, ypos, width, height)
+        bitize(data, out=memoryview(message)[header_end:header_end + bit_size])
+        message[-1] = SYSEX_END
+        return message
+
+    def compile_draw_image(self, zone_id: int, xpos: int, ypos: int, width: int, height: int, rgb_data: np.ndarray) -> bytes:
+        """Build a complete Draw Image SysEx message, ready to be sent as is."""
+        return bytes(self._draw_image_message(zone_id, xpos, ypos, width, height,
+                                              utils.bitize7chksum, np.ascontiguousarray(rgb_data, dtype=np.uint8)))
+
+    def compile_draw_image_from_bgr(self, zone_id: int, xpos: int, ypos: int, width: int, height: int, bgr: np.ndarray) -> bytes:
+        """Build a complete Draw Image SysEx message from a top-down BGR image (e.g. OpenCV)."""
+        _check_bgr(bgr, width, height)
+        return bytes(self._draw_image_message(zone_id, xpos, ypos, width, height,
+                                              utils.bitize7chksum_bgr, bgr))
+
+    def send_draw_image(self, zone_id: int, xpos: int, ypos: int, width: int, height: int, rgb_data: np.ndarray) -> None:
+        """Send a Draw Image message (rgb_data: flat uint8 RGB array, C-contiguous)."""
+        self._send(self._draw_image_message(zone_id, xpos, ypos, width, height,
+                                            utils.bitize7chksum, np.ascontiguousarray(rgb_data, dtype=np.uint8)))
+
+    def send_draw_image_from_bgr(self, zone_id: int, xpos: int, ypos: int, width: int, height: int, bgr: np.ndarray) -> None:
+        """Send a Draw Image message from a top-down BGR image of shape (height, width, 3).
+
+        The RGB conversion and the vertical flip are done while bitizing,
+        no need to call cv2.cvtColor or flip the image beforehand."""
+        _check_bgr(bgr, width, height)
+        self._send(self._draw_image_message(zone_id, xpos, ypos, width, height,
+                                            utils.bitize7chksum_bgr, bgr))
 
     def close(self) -> None:
-        """Close the MIDI output port."""
+        """Stop the poll thread and close the MIDI output port."""
+        if self._pump_thread is not None:
+            self._running = False
+            self._pump_thread.join()
+            self._pump_thread = None
         self.midi_out.close_port()
         print("MIDI port closed.")
@@ -1,4 +1,26 @@
-from functools import reduce
+from functools import lru_cache, reduce
+from operator import xor
+from typing import Union
+
+import numpy as np
+
+try:
+    # Ahead-of-time compiled kernels (see _compile_kernels.py)
+    from .erae_kernels import bitize7 as _bitize7, unbitize7 as _unbitize7, \
+        bgr_to_bitized7 as _bgr_to_bitized7
+except ImportError:
+    try:
+        from ._bit_kernels import bitize7_nb as _bitize7, unbitize7_nb as _unbitize7, \
+            bgr_to_bitized7_nb as _bgr_to_bitized7
+    except ImportError:
+        try:
+            # Numba not installed: Cython build of the same kernels
+            from ._bit_cy import bitize7 as _bitize7, unbitize7 as _unbitize7, \
+                bgr_to_bitized7 as _bgr_to_bitized7
+        except ImportError:
+            # Neither available: pure Python (slow, but always importable)
+            from ._bit_py import bitize7 as _bitize7, unbitize7 as _unbitize7, \
+                bgr_to_bitized7 as _bgr_to_bitized7
 
 
 def choose_port(ports, port_type):
@@ -42,49 +64,82 @@ def clamp(n, a, b):
     return min(max(n, a), b)
 
 
+@lru_cache(maxsize=64)
 def bitized7size(length: int) -> int:
     # Get size of the resulting 7 bits bytes array obtained when using the bitize7 function
     return length // 7 * 8 + ((1 + length % 7) if (length % 7 > 0) else 0)
 
 
+@lru_cache(maxsize=64)
 def unbitized7size(length: int) -> int:
     # Get size of the resulting 7 bits bytes array obtained when using the bitize7 function
     return length // 8 * 7 + ((length % 8 - 1) if (length % 8 > 0) else 0)
 
 
-def bitize7chksum(data: list[int], append_checksum: bool = True) -> list[int]:
+def bitize7chksum(data: np.ndarray, append_checksum: bool = True, out: bytearray = None) -> Union[bytes, memoryview]:
     # 7-bitize an array of bytes and add the resulting checksum
-    bitized7Arr = sum(([sum((el & 0x80) >> (j+1) for j, el in enumerate(data[i:min(i+7, len(data))]))] +
-                      [el & 0x7F for el in data[i:min(i+7, len(data))]] for i in range(0, len(data), 7)), [])
-
+    # (uint8 C-contiguous arrays are used as is, anything else is converted)
+    # If out is large enough, the result is written there and a memoryview on
+    # it is returned instead of a new bytes object
+    src = np.ascontiguousarray(data, dtype=np.uint8)
+    size = bitized7size(len(src))
+    total = size + 1 if append_checksum else size
+    if out is not None and len(out) >= total:
+        bitized7Arr = np.frombuffer(out, dtype=np.uint8, count=total)
+    else:
+        out = None
+        bitized7Arr = np.empty(total, dtype=np.uint8)
+    chksum = _bitize7(src, bitized7Arr)
     if append_checksum:
-        return bitized7Arr + [reduce(lambda x, y: x ^ y, bitized7Arr)]
+        bitized7Arr[size] = chksum
+
+    if out is not None:
+        return memoryview(out)[:total]
+    return bitized7Arr.tobytes()
+
+
+def bitize7chksum_bgr(bgr: np.ndarray, out: bytearray = None) -> Union[bytes, memoryview]:
+    # 7-bitize a BGR image (height, width, 3) in one pass, in the Erae pixel
+    # order (RGB, bottom row first), and add the resulting checksum
+    # out: same as bitize7chksum
+    size = bitized7size(bgr.size)
+    total = size + 1
+    if out is not None and len(out) >= total:
+        bitized7Arr = np.frombuffer(out, dtype=np.uint8, count=total)
     else:
-        return bitized7Arr
+        out = None
+        bitized7Arr = np.empty(total, dtype=np.uint8)
+    bitized7Arr[size] = _bgr_to_bitized7(bgr, bitized7Arr)
+
+    if out is not None:
+        return memoryview(out)[:total]
+    return bitized7Arr.tobytes()
 
 
 def checksum(data: list[int]) -> int:
-    return reduce(lambda x, y: x ^ y, data)
+    # XOR of all the bytes (bitize7chksum / unbitize7chksum compute it inline)
+    if isinstance(data, np.ndarray):
+        return int(np.bitwise_xor.reduce(data, initial=0))
+    return reduce(xor, data, 0)
 
 
-def unbitize7chksum(bitized_data: list[int], checksum: int = None) -> list[int]:
+def unbitize7chksum(bitized_data: np.ndarray, checksum: int = None, out: bytearray = None) -> Union[bytearray, memoryview]:
     # Rebuild the 8-bit data from the 7-bit segments
-    original_data = [0] * unbitized7size(len(bitized_data))
-
-    i = 0
-    outsize = 0
-    inlen = len(bitized_data)
-    while i < len(bitized_data):
-        for j in range(7):
-            if (j + 1 + i < inlen):
-                original_data[outsize + j] = ((bitized_data[i]
-                                               << (j + 1)) & 0x80) | bitized_data[i + j + 1]
-        outsize = outsize+7
-        i = i + 8
+    # If out is large enough, the data is written there and a memoryview on it
+    # is returned instead of a new bytearray
+    # (uint8 C-contiguous arrays are used as is, anything else is converted:
+    # the compiled kernels only accept that layout)
+    src = np.ascontiguousarray(bitized_data, dtype=np.uint8)
+    size = unbitized7size(len(src))
+    if out is not None and len(out) >= size:
+        original_data = memoryview(out)[:size]
+    else:
+        original_data = bytearray(size)
+    calculated_checksum = _unbitize7(
+        src, np.frombuffer(original_data, dtype=np.uint8))
 
     # Validate checksum (should match the XOR of all the bytes in the bitized data)
     if checksum is not None:
-        calculated_checksum = reduce(lambda x, y: x ^ y, bitized_data)
         if checksum != calculated_checksum:
             print("Warning: Checksum mismatch! {} {}".format(
                 checksum, calculated_checksum))
@@ -1,4 +1,5 @@
 import time
+from typing import Optional
 import cv2
 import rtmidi
 
@@ -6,16 +7,17 @@ from erae import erae_api_sysex
 from erae import utils
 
 
-def send_image(erae_device: erae_api_sysex.EraeAPISysex) -> None:
+def compile_image(erae_device: erae_api_sysex.EraeAPISysex) -> Optional[bytes]:
+    """Build the Draw Image message for the tiger image once (None if the image is missing)."""
     image = cv2.imread('tiger.png')
     if image is None:
         print("Error: Image not found.")
+        return None
     else:
         # Convert the image to a specific size (for example, 640x480)
         target_width = 24
         target_height = 24
         resized_image = cv2.resize(image, (target_width, target_height))
-        resized_image = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB)
         if resized_image.dtype != 'uint8' or len(resized_image.shape) != 3 or resized_image.shape[2] != 3:
             resized_image = cv2.convertScaleAbs(resized_image)
 
@@ -23,11 +25,9 @@ def send_image(erae_device: erae_api_sysex.EraeAPISysex) -> None:
         # - Origin: bottom left
         # - X: positive right
         # - Y: positive up
-        resized_imageinverted = resized_image[::-1, :, :]
-        flat_data = resized_imageinverted.flatten()
-
-        erae_device.send_draw_image(
-            0, 0, 0, target_width, target_height, flat_data)
+        # The BGR to RGB conversion and the vertical flip are done while bitizing
+        return erae_device.compile_draw_image_from_bgr(
+            0, 0, 0, target_width, target_height, resized_image)
 
 
 def send_draw_rectangle(erae_device: erae_api_sysex.EraeAPISysex) -> None:
@@ -43,17 +43,13 @@ def send_draw_rectangle(erae_device: erae_api_sysex.EraeAPISysex) -> None:
         target_width = 24
         target_height = 24
         resized_image = cv2.resize(image, (target_width, target_height))
-        resized_image = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB)
 
         if resized_image.dtype != 'uint8' or len(resized_image.shape) != 3 or resized_image.shape[2] != 3:
             resized_image = cv2.convertScaleAbs(resized_image)
 
-        resized_imageinverted = resized_image[::-1, :, :]
-        flat_data = resized_imageinverted.flatten()
-
         erae_device.send_clear_zone_display(0)
-        erae_device.send_draw_image(
-            0, 0, 0, target_width, target_height, flat_data)
+        erae_device.send_draw_image_from_bgr(
+            0, 0, 0, target_width, target_height, resized_image)
 
 
 if __name__ == "__main__":
@@ -87,6 +83,10 @@ if __name__ == "__main__":
     # Get zone boundary
     erae_device.send_zone_boundary_request(0)
 
+    # The clear and image messages never change: build them once
+    clear_zone_message = erae_device.compile_clear_zone(0)
+    image_message = compile_image(erae_device)
+
     try:
         last_time = 0
         mode = 0
@@ -94,15 +94,16 @@ if __name__ == "__main__":
             if (time.time() > last_time + 5):
                 mode = (mode % 3)
                 if mode == 0:
-                    erae_device.send_clear_zone_display(0)
-                    send_image(erae_device)
+                    erae_device.midi_out.send_message(clear_zone_message)
+                    if image_message is not None:
+                        erae_device.midi_out.send_message(image_message)
 
                 elif mode == 1:
-                    erae_device.send_clear_zone_display(0)
+                    erae_device.midi_out.send_message(clear_zone_message)
                     erae_device.send_draw_rectangle(0, 5, 5, 6, 10, 100, 0, 0)
 
                 elif mode == 2:
-                    erae_device.send_clear_zone_display(0)
+                    erae_device.midi_out.send_message(clear_zone_message)
                     erae_device.send_draw_pixel(0, 3, 3, 0, 0, 100)
 
                 mode += 1
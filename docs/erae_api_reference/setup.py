@@ -1,4 +1,13 @@
-from setuptools import setup
+from setuptools import Extension, setup
+
+# Optional: Cython build of the bit kernels, used when Numba is not installed
+ext_modules = []
+try:
+    from Cython.Build import cythonize
+    ext_modules += cythonize(
+        [Extension('erae._bit_cy', ['erae/_bit_cy.pyx'], optional=True)])
+except ImportError:
+    pass
 
 setup(name="erae_api_sysex",
       version='0.1b',
@@ -6,4 +15,8 @@ setup(name="erae_api_sysex",
       py_modules=[],
       install_requires=['python-rtmidi',
                         'opencv-python',
-                        ])
+                        'numpy',
+                        ],
+      # Faster bit kernels with Numba (or the Cython extension above)
+      extras_require={'numba': ['numba']},
+      ext_modules=ext_modules)